@@ -1,3 +1,4 @@
+import heapq
 import os
 
 EXCLUDED_KEYWORDS = ['venv', '__pycache__']  # Case-insensitive
@@ -10,15 +11,21 @@ def print_tree(start_path=".", max_depth=3, current_depth=0, prefix="", file_lim
     if current_depth > max_depth:
         return
 
+    # One pass over os.scandir: entry types come from the directory listing,
+    # so no extra stat call per entry
+    dirs, files = [], []
     try:
-        entries = sorted(os.listdir(start_path))
+        with os.scandir(start_path) as it:
+            for e in it:
+                if e.is_dir():
+                    dirs.append(e.name)
+                elif e.is_file() and not e.name.startswith('.'):
+                    files.append(e.name)
     except (PermissionError, FileNotFoundError):
         return
 
-    dirs = [e for e in entries if os.path.isdir(os.path.join(start_path, e))]
-    files = [e for e in entries if os.path.isfile(os.path.join(start_path, e)) and not e.startswith('.')]
-
-    shown_dirs = dirs[:folder_limit]
+    # Only the entries that get printed need to be sorted
+    shown_dirs = heapq.nsmallest(folder_limit, dirs)
     for entry in shown_dirs:
         full_path = os.path.join(start_path, entry)
         print(f"{prefix}📁 {entry}/")
@@ -31,7 +38,7 @@ def print_tree(start_path=".", max_depth=3, current_depth=0, prefix="", file_lim
     if len(dirs) > folder_limit:
         print(f"{prefix}... ({len(dirs) - folder_limit} more folders hidden)")
 
-    shown_files = files[:file_limit]
+    shown_files = heapq.nsmallest(file_limit, files)
     for entry in shown_files:
         print(f"{prefix}📄 {entry}")
 
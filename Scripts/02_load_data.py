@@ -2,8 +2,11 @@
 Load petroleum production data into PostgreSQL
 """
 
+import csv
+from io import StringIO
+
 import pandas as pd
-from sqlalchemy import create_engine
+from db import DB_NAME, get_engine
 
 # =============================================================================
 # CONFIGURATION
@@ -12,12 +15,101 @@ from sqlalchemy import create_engine
 # CSV file path
 CSV_PATH = R"E:\Documents-E\Full-Stack Analyst Project\Production Data\Raw\petroleum.csv"
 
-# PostgreSQL connection details
-DB_USER = "postgres"
-DB_PASSWORD = "motorola"  # ← CHANGE THIS!
-DB_HOST = "localhost"
-DB_PORT = "5432"
-DB_NAME = "well_decline_analysis"
+# PostgreSQL connection details live in db.py
+
+# Rows read from the CSV and sent to PostgreSQL per COPY
+CHUNK_SIZE = 100_000
+
+# CSV parser: 'c' streams the file chunk by chunk (memory bounded by CHUNK_SIZE);
+# 'pyarrow' parses the whole file on multiple threads (needs pyarrow installed)
+CSV_ENGINE = 'c'
+
+# Column names in the 'production' table (CSV order, index column excluded)
+DB_COLUMNS = [
+    'production_date',
+    'avg_downhole_pressure',
+    'avg_downhole_temperature',
+    'avg_dp_tubing',
+    'avg_choke_size_p',
+    'avg_whp_p',
+    'avg_wht_p',
+    'dp_choke_size',
+    'oil_volume',
+    'gas_volume',
+    'water_volume'
+]
+
+# Explicit CSV dtypes keyed by database column name (skips type inference)
+CSV_DTYPES = {
+    'avg_downhole_pressure': 'float64',
+    'avg_downhole_temperature': 'float64',
+    'avg_dp_tubing': 'float64',
+    'avg_choke_size_p': 'float64',
+    'avg_whp_p': 'float64',
+    'avg_wht_p': 'float64',
+    'dp_choke_size': 'float64',
+    'oil_volume': 'float64',
+    'gas_volume': 'float64',
+    'water_volume': 'float64'
+}
+
+# =============================================================================
+# COPY HELPERS
+# =============================================================================
+
+def psql_copy_insert(table, conn, keys, data_iter):
+    """
+    pandas to_sql insert method using PostgreSQL COPY FROM STDIN
+
+    Streams all rows through a single COPY command instead of issuing
+    batched INSERT statements, skipping per-row SQL parsing and planning.
+    """
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(data_iter)
+    buf.seek(0)
+
+    columns = ', '.join(f'"{k}"' for k in keys)
+    table_name = f'{table.schema}.{table.name}' if table.schema else table.name
+
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH CSV", buf)
+
+# =============================================================================
+# READ CSV
+# =============================================================================
+
+def read_csv_chunks():
+    """
+    Yield the CSV file as DataFrames of at most CHUNK_SIZE rows
+    
+    Columns come out already named after the 'production' table.
+    
+    The 'c' engine streams the file, so only one chunk is held in memory.
+    The 'pyarrow' engine cannot stream: it parses the whole file with its
+    multithreaded reader and the result is handed out in CHUNK_SIZE slices.
+    """
+    options = dict(
+        index_col=0,                       # Skip the unnamed index column
+        header=0,                          # Replace the CSV header...
+        names=['row_id'] + DB_COLUMNS,     # ...with the database column names
+        dtype=CSV_DTYPES,                  # No dtype inference
+        parse_dates=['production_date']    # Dates parsed while reading
+    )
+    
+    if CSV_ENGINE == 'pyarrow':
+        # pyarrow rejects positional usecols; the file has exactly the 12 columns
+        df = pd.read_csv(CSV_PATH, engine='pyarrow', **options)
+        for start in range(0, len(df), CHUNK_SIZE):
+            yield df.iloc[start:start + CHUNK_SIZE]
+    else:
+        yield from pd.read_csv(
+            CSV_PATH,
+            engine='c',
+            usecols=range(len(DB_COLUMNS) + 1),  # Index + the 11 data columns only
+            chunksize=CHUNK_SIZE,
+            **options
+        )
 
 # =============================================================================
 # LOAD DATA
@@ -30,68 +122,56 @@ def load_data():
     print("LOADING PETROLEUM DATA INTO POSTGRESQL")
     print("=" * 70)
     
-    # 1. Read CSV (ignore the index column)
-    print(f"\n📁 Reading CSV file...")
-    df = pd.read_csv(CSV_PATH, index_col=0)  # Skip the unnamed index column
-    print(f"✅ Loaded {len(df):,} rows")
-    print(f"✅ Columns: {list(df.columns)}")
-    
-    # 2. Rename columns to match database table
-    print(f"\n🔄 Renaming columns to match database...")
-    df.columns = [
-        'production_date',
-        'avg_downhole_pressure',
-        'avg_downhole_temperature',
-        'avg_dp_tubing',
-        'avg_choke_size_p',
-        'avg_whp_p',
-        'avg_wht_p',
-        'dp_choke_size',
-        'oil_volume',
-        'gas_volume',
-        'water_volume'
-    ]
-    print(f"✅ Columns renamed")
-    
-    # 3. Convert date column to datetime
-    print(f"\n📅 Converting dates...")
-    df['production_date'] = pd.to_datetime(df['production_date'])
-    print(f"✅ Dates converted")
-    
-    # 4. Show data preview
-    print(f"\n🔍 Data preview:")
-    print(df.head())
-    print(f"\n📊 Date range: {df['production_date'].min()} to {df['production_date'].max()}")
-    print(f"📊 Total rows: {len(df):,}")
-    
-    # 5. Connect to PostgreSQL
+    # 1. Connect to PostgreSQL
     print(f"\n🔌 Connecting to PostgreSQL...")
-    connection_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(connection_string)
+    engine = get_engine()
     print(f"✅ Connected to database: {DB_NAME}")
     
-    # 6. Load data into table
-    print(f"\n⬆️  Loading data into 'production' table...")
+    # 2. Stream CSV into 'production' table, one chunk at a time
+    #    (one transaction overall)
+    print(f"\n⬆️  Streaming CSV into 'production' table ({CHUNK_SIZE:,} rows per chunk, {CSV_ENGINE} parser)...")
     print(f"   This may take a moment...")
     
-    df.to_sql(
-        'production',
-        engine,
-        if_exists='append',  # Add to existing table
-        index=False,         # Don't include pandas index
-        method='multi',      # Fast bulk insert
-        chunksize=1000       # Insert 1000 rows at a time
-    )
+    total_rows = 0
+    min_date = max_date = None
+    
+    with engine.begin() as conn:
+        for chunk in read_csv_chunks():
+            if total_rows == 0:
+                print(f"\n🔍 Data preview:")
+                print(chunk.head())
+                print()
+            
+            chunk.to_sql(
+                'production',
+                conn,
+                if_exists='append',  # Add to existing table
+                index=False,         # Don't include pandas index
+                method=psql_copy_insert  # Bulk load via COPY FROM STDIN
+            )
+            
+            total_rows += len(chunk)
+            chunk_min = chunk['production_date'].min()
+            chunk_max = chunk['production_date'].max()
+            min_date = chunk_min if min_date is None else min(min_date, chunk_min)
+            max_date = chunk_max if max_date is None else max(max_date, chunk_max)
+            print(f"   ... {total_rows:,} rows loaded")
+        
+        # Index the date column used by the monthly aggregation
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS idx_production_date ON production (production_date);"
+        )
     
-    print(f"✅ Successfully loaded {len(df):,} rows into database!")
+    print(f"\n📊 Date range: {min_date} to {max_date}")
+    print(f"✅ Successfully loaded {total_rows:,} rows into database!")
     
-    # 7. Verify data was loaded
+    # 3. Verify data was loaded
     print(f"\n🔍 Verifying data in database...")
     verify_query = "SELECT COUNT(*) as total_rows FROM production;"
     result = pd.read_sql(verify_query, engine)
     print(f"✅ Database now contains {result['total_rows'][0]:,} rows")
     
-    # 8. Show sample data from database
+    # 4. Show sample data from database
     print(f"\n📋 Sample data from database:")
     sample_query = """
     SELECT 
@@ -6,25 +6,62 @@ Analyzes production data and fits hyperbolic decline curves
 
 import pandas as pd
 import numpy as np
-from scipy.optimize import curve_fit
-from sqlalchemy import create_engine
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import least_squares
+from db import get_engine
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
-DB_USER = "postgres"
-DB_PASSWORD = "motorola"  # ← UPDATE THIS
-DB_HOST = "localhost"
-DB_PORT = "5432"
-DB_NAME = "well_decline_analysis"
+# PostgreSQL connection details live in db.py
+
+# Well the 'production' table belongs to (the table has no well_id column)
+WELL_ID = "WELL_001"
+
+# First month of the decline fitting window (fit uses months FIT_START_MONTH onwards)
+FIT_START_MONTH = 70
+
+# Decline curve chart (set GENERATE_PLOT = False for batch runs)
+GENERATE_PLOT = True
+PLOT_PATH = r"E:\Documents-E\Full-Stack Analyst Project\decline_curve.png"
+PLOT_DPI = 150
 
 # =============================================================================
 # DECLINE CURVE FUNCTIONS
 # =============================================================================
 
+# Below this b-factor the hyperbolic curve is treated as exponential decline
+B_EXPONENTIAL_TOL = 1e-6
+
+def decline_scalars(Di, b):
+    """
+    Per-curve scalars of the decline formula, computed once
+    
+    Returns: (b*Di, 1/b), or None for exponential decline (b < B_EXPONENTIAL_TOL)
+    """
+    if b < B_EXPONENTIAL_TOL:
+        return None
+    return b * Di, 1.0 / b
+
+
+def decline_rate(t, qi, Di, scalars):
+    """
+    Production rate at time t given precomputed decline_scalars
+    
+    Single implementation shared by hyperbolic_decline and make_decline_curve.
+    """
+    if scalars is None:
+        # Exponential limit (b -> 0): q = qi * exp(-Di*t)
+        return qi * np.exp(-Di * t)
+    
+    # log1p keeps small b*Di*t from rounding away
+    bDi, inv_b = scalars
+    return qi * np.exp(-np.log1p(bDi * t) * inv_b)
+
+
 def hyperbolic_decline(t, qi, Di, b):
     """
     Hyperbolic decline curve equation
@@ -37,7 +74,101 @@ def hyperbolic_decline(t, qi, Di, b):
     
     Returns: production rate at time t
     """
-    return qi / ((1 + b * Di * t) ** (1/b))
+    return decline_rate(t, qi, Di, decline_scalars(Di, b))
+
+
+def make_decline_curve(qi, Di, b):
+    """
+    Bind fitted decline parameters into a function of time only
+    
+    Parameters:
+    - qi, Di, b: decline curve parameters (see hyperbolic_decline)
+    
+    Returns: function q(t) equal to hyperbolic_decline(t, qi, Di, b)
+    """
+    # Scalars computed once here instead of on every evaluation
+    scalars = decline_scalars(Di, b)
+    
+    def decline(t):
+        return decline_rate(t, qi, Di, scalars)
+    return decline
+
+
+def jac_hyperbolic(t, qi, Di, b):
+    """
+    Analytic Jacobian of hyperbolic_decline
+    
+    Parameters:
+    - t: time (months)
+    - qi, Di, b: decline curve parameters (see hyperbolic_decline)
+    
+    Returns: (N, 3) array of partial derivatives dq/dqi, dq/dDi, dq/db
+    """
+    t = np.asarray(t, dtype=float)
+    
+    if b < B_EXPONENTIAL_TOL:
+        # Exponential limit (b -> 0): q = qi * exp(-Di*t)
+        dq_dqi = np.exp(-Di * t)
+        q = qi * dq_dqi
+        dq_dDi = -t * q
+        dq_db = q * (Di * t) ** 2 / 2
+    else:
+        log_base = np.log1p(b * Di * t)
+        base = 1 + b * Di * t
+        dq_dqi = np.exp(-log_base / b)
+        q = qi * dq_dqi
+        dq_dDi = -t * q / base
+        dq_db = q * (log_base / b**2 - Di * t / (b * base))
+    
+    return np.column_stack([dq_dqi, dq_dDi, dq_db])
+
+
+def residual_hyperbolic(params, t, q):
+    """
+    Residuals of the hyperbolic decline model for least_squares
+    
+    Parameters:
+    - params: (qi, Di, b)
+    - t: time (months)
+    - q: observed production rate at t
+    
+    Returns: model rate minus observed rate at each t
+    """
+    qi, Di, b = params
+    resid = hyperbolic_decline(t, qi, Di, b)
+    resid -= q  # In place: no second array per evaluation
+    return resid
+
+
+def jac_residual_hyperbolic(params, t, q):
+    """Jacobian of residual_hyperbolic (same as the model Jacobian)"""
+    return jac_hyperbolic(t, *params)
+
+
+def cumulative_production(qi, Di, b, t):
+    """
+    Cumulative production from 0 to t (closed-form integral of hyperbolic_decline)
+    
+    Parameters:
+    - qi: initial production rate (bbl/month)
+    - Di: initial decline rate (1/month)
+    - b: hyperbolic exponent
+    - t: time (months)
+    
+    Returns: cumulative production in barrels
+    """
+    if Di == 0:
+        # No decline: constant rate
+        return qi * t
+    
+    # expm1/log1p keep small Di*t from rounding the integral to zero
+    if b < B_EXPONENTIAL_TOL:
+        # Exponential decline
+        return -qi / Di * np.expm1(-Di * t)
+    if abs(b - 1) < B_EXPONENTIAL_TOL:
+        # Harmonic decline
+        return qi / Di * np.log1p(Di * t)
+    return -qi / ((1 - b) * Di) * np.expm1((b - 1) / b * np.log1p(b * Di * t))
 
 
 def calculate_eur(qi, Di, b, economic_limit=10):
@@ -52,16 +183,158 @@ def calculate_eur(qi, Di, b, economic_limit=10):
     
     Returns: EUR in barrels
     """
+    # No decline: the economic limit is never reached
+    if Di == 0:
+        return np.inf
+    
     # Find time to reach economic limit
-    t_max = ((qi/economic_limit)**b - 1) / (b * Di)
+    if b < B_EXPONENTIAL_TOL:
+        t_max = np.log(qi/economic_limit) / Di
+    else:
+        t_max = ((qi/economic_limit)**b - 1) / (b * Di)
     
     # Integrate decline curve from 0 to t_max
-    time_points = np.linspace(0, t_max, 1000)
-    production_points = hyperbolic_decline(time_points, qi, Di, b)
-    eur = np.trapz(production_points, time_points)
+    eur = cumulative_production(qi, Di, b, t_max)
     
     return eur
 
+# =============================================================================
+# RESULT TABLES
+# =============================================================================
+
+# Tables written by the analysis (column types match what to_sql created)
+RESULT_TABLES = {
+    'decline_parameters': """
+    CREATE TABLE IF NOT EXISTS decline_parameters (
+        well_id TEXT,
+        qi DOUBLE PRECISION,
+        di DOUBLE PRECISION,
+        b_factor DOUBLE PRECISION,
+        r_squared DOUBLE PRECISION,
+        eur DOUBLE PRECISION,
+        cumulative_production DOUBLE PRECISION,
+        remaining_reserves DOUBLE PRECISION,
+        analysis_date TIMESTAMP
+    );
+    """,
+    'production_forecast': """
+    CREATE TABLE IF NOT EXISTS production_forecast (
+        forecast_date TIMESTAMP,
+        months_on_production BIGINT,
+        predicted_oil DOUBLE PRECISION
+    );
+    """,
+    'monthly_production': """
+    CREATE TABLE IF NOT EXISTS monthly_production (
+        year_month TIMESTAMP,
+        months_on_production BIGINT,
+        oil_volume DOUBLE PRECISION,
+        gas_volume DOUBLE PRECISION,
+        water_volume DOUBLE PRECISION
+    );
+    """
+}
+
+
+def replace_table_rows(cur, table, df):
+    """
+    Replace the contents of a result table with the rows of df
+    
+    Empties the table with TRUNCATE (creating it on first run) and inserts
+    the rows with execute_values. The schema is kept, and the caller's
+    transaction decides when the new rows become visible.
+    """
+    cur.execute(RESULT_TABLES[table])
+    cur.execute(f"TRUNCATE {table};")
+    
+    columns = ', '.join(df.columns)
+    rows = list(df.itertuples(index=False, name=None))
+    execute_values(cur, f"INSERT INTO {table} ({columns}) VALUES %s", rows, page_size=1000)
+
+# =============================================================================
+# WELL FITTING
+# =============================================================================
+
+def fit_well(well_id, monthly):
+    """
+    Fit the hyperbolic decline curve for one well and compute its reserves
+    
+    Parameters:
+    - well_id: well identifier
+    - monthly: monthly production with months_on_production and oil_volume
+    
+    Returns: dict of decline parameters (one decline_parameters row)
+    """
+    # Filter to the fitting window (months FIT_START_MONTH onwards), as plain float arrays
+    mask = monthly['months_on_production'].to_numpy() >= FIT_START_MONTH
+
+    # Reset time to start at 0 for fitting
+    t = monthly.loc[mask, 'months_on_production'].to_numpy(dtype=np.float64) - FIT_START_MONTH
+    q = monthly.loc[mask, 'oil_volume'].to_numpy(dtype=np.float64)
+    
+    # Initial guesses for parameters (from recent data)
+    qi_guess = q[0]  # First month of recent period
+    Di_guess = 0.10  # 10% monthly decline (expect higher for depleted well)
+    b_guess = 0.0    # Start with exponential
+    
+    # Fit the curve
+    result = least_squares(
+        residual_hyperbolic,
+        x0=[qi_guess, Di_guess, b_guess],
+        jac=jac_residual_hyperbolic,          # Analytic Jacobian (no finite differences)
+        bounds=([0, 0, 0], [np.inf, 1, 2]),  # Parameter bounds
+        args=(t, q),
+        max_nfev=10000
+    )
+    if not result.success:
+        raise RuntimeError(f"Optimal parameters not found for {well_id}: {result.message}")
+    
+    qi_fit, Di_fit, b_fit = result.x
+    
+    # Calculate R² (goodness of fit) from the same curve that is forecast and plotted
+    q_pred = make_decline_curve(qi_fit, Di_fit, b_fit)(t)
+    ss_res = np.sum((q - q_pred) ** 2)
+    ss_tot = np.sum((q - np.mean(q)) ** 2)
+    r_squared = 1 - (ss_res / ss_tot)
+    
+    # Future production from month 20 onwards (210 months total life from fitting start)
+    future_reserves = (cumulative_production(qi_fit, Di_fit, b_fit, 210)
+                       - cumulative_production(qi_fit, Di_fit, b_fit, 20))
+
+    # Historical cumulative
+    cumulative_to_date = monthly['oil_volume'].sum()
+
+    # Total EUR
+    eur = cumulative_to_date + future_reserves
+    
+    return {
+        'well_id': well_id,
+        'qi': qi_fit,
+        'di': Di_fit,
+        'b_factor': b_fit,
+        'r_squared': r_squared,
+        'eur': eur,
+        'cumulative_production': cumulative_to_date,
+        'remaining_reserves': future_reserves
+    }
+
+
+def fit_wells(wells):
+    """
+    Fit decline curves for several wells
+    
+    Parameters:
+    - wells: dict of {well_id: monthly production DataFrame}
+    
+    Returns: list of fit_well results, in the same order as wells
+    """
+    if len(wells) == 1:
+        return [fit_well(well_id, monthly) for well_id, monthly in wells.items()]
+    
+    # Fits are independent and CPU-bound: one worker process per core
+    with ProcessPoolExecutor() as pool:
+        return list(pool.map(fit_well, wells.keys(), wells.values()))
+
 # =============================================================================
 # MAIN ANALYSIS
 # =============================================================================
@@ -75,41 +348,32 @@ def analyze_production():
     
     # 1. Connect to database
     print("\n🔌 Connecting to PostgreSQL...")
-    connection_string = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(connection_string)
+    engine = get_engine()
     print("✅ Connected!")
     
-    # 2. Load daily production data
-    print("\n📊 Loading production data...")
+    # 2. Load monthly production (aggregated in PostgreSQL)
+    print("\n📊 Loading monthly production data...")
     query = """
     SELECT 
-        production_date,
-        oil_volume,
-        gas_volume,
-        water_volume
+        date_trunc('month', production_date::timestamp) AS year_month,
+        COUNT(*) AS production_days,
+        COALESCE(SUM(oil_volume), 0) AS oil_volume,
+        COALESCE(SUM(gas_volume), 0) AS gas_volume,
+        COALESCE(SUM(water_volume), 0) AS water_volume
     FROM production
-    ORDER BY production_date;
+    WHERE production_date IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1;
     """
-    df = pd.read_sql(query, engine)
-    
-    # Convert to datetime (fix for .dt accessor)
-    df['production_date'] = pd.to_datetime(df['production_date'])
-    
-    print(f"✅ Loaded {len(df):,} days of data")
-    print(f"   Date range: {df['production_date'].min()} to {df['production_date'].max()}")
-    
-    # 3. Aggregate to monthly production
-    print("\n📅 Aggregating to monthly production...")
-    df['year_month'] = df['production_date'].dt.to_period('M')
+    # Server-side cursor: rows are streamed instead of buffered by the driver
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=50_000) as conn:
+        monthly = pd.read_sql(query, conn)
     
-    monthly = df.groupby('year_month').agg({
-        'oil_volume': 'sum',
-        'gas_volume': 'sum',
-        'water_volume': 'sum'
-    }).reset_index()
+    print(f"✅ Loaded {monthly['production_days'].sum():,} days of data")
+    print(f"   Month range: {monthly['year_month'].min()} to {monthly['year_month'].max()}")
     
-    monthly['year_month'] = monthly['year_month'].dt.to_timestamp()
-    monthly['months_on_production'] = range(len(monthly))
+    # 3. Number the months
+    monthly['months_on_production'] = np.arange(len(monthly), dtype=np.int32)
     
     print(f"✅ Created {len(monthly)} months of aggregated data")
     print(f"\n📈 Monthly production statistics:")
@@ -118,37 +382,20 @@ def analyze_production():
     # 4. Fit hyperbolic decline curve to oil production (LAST 20 MONTHS ONLY)
     print("\n🔧 Fitting hyperbolic decline curve to last 20 months...")
 
-    # Filter to last 20 months only (months 70-89)
-    recent_data = monthly[monthly['months_on_production'] >= 70].copy()
+    # Time axis of the fitting window (reset to start at 0)
+    t = np.arange(np.count_nonzero(monthly['months_on_production'] >= FIT_START_MONTH))
 
-    # Reset time to start at 0 for fitting
-    t = (recent_data['months_on_production'] - 70).values
-    q = recent_data['oil_volume'].values
-
-    print(f"   Using months 70-89 ({len(t)} data points)")
-    
-    # Initial guesses for parameters (from recent data)
-    qi_guess = recent_data['oil_volume'].iloc[0]  # First month of recent period
-    Di_guess = 0.10  # 10% monthly decline (expect higher for depleted well)
-    b_guess = 0.0    # Start with exponential
+    print(f"   Using months {FIT_START_MONTH}-{FIT_START_MONTH + len(t) - 1} ({len(t)} data points)")
     
     try:
-        # Fit the curve
-        params, covariance = curve_fit(
-            hyperbolic_decline,
-            t, q,
-            p0=[qi_guess, Di_guess, b_guess],
-            bounds=([0, 0, 0], [np.inf, 1, 2]),  # Parameter bounds
-            maxfev=10000
-        )
+        # Fit the curve (one fit per well, in parallel when there are several)
+        params_df = pd.DataFrame(fit_wells({WELL_ID: monthly}))
+        params_df['analysis_date'] = datetime.now()
         
-        qi_fit, Di_fit, b_fit = params
-        
-        # Calculate R² (goodness of fit)
-        q_pred = hyperbolic_decline(t, qi_fit, Di_fit, b_fit)
-        ss_res = np.sum((q - q_pred) ** 2)
-        ss_tot = np.sum((q - np.mean(q)) ** 2)
-        r_squared = 1 - (ss_res / ss_tot)
+        well = params_df.iloc[0]
+        qi_fit, Di_fit, b_fit = well['qi'], well['di'], well['b_factor']
+        r_squared = well['r_squared']
+        decline = make_decline_curve(qi_fit, Di_fit, b_fit)
         
         print("✅ Decline curve fitted successfully!")
         print(f"\n📊 Decline Curve Parameters:")
@@ -159,18 +406,9 @@ def analyze_production():
         
         # 5. Calculate EUR (future production + historical)
         print("\n🎯 Calculating EUR...")
-
-        # Future production from month 20 onwards (210 months total life from fitting start)
-        time_future = np.arange(20, 210)
-        production_future = hyperbolic_decline(time_future, qi_fit, Di_fit, b_fit)
-        future_reserves = np.trapezoid(production_future, time_future)
-
-        # Historical cumulative
-        cumulative_to_date = monthly['oil_volume'].sum()
-
-        # Total EUR
-        eur = cumulative_to_date + future_reserves
-        remaining_reserves = future_reserves
+        cumulative_to_date = well['cumulative_production']
+        eur = well['eur']
+        remaining_reserves = well['remaining_reserves']
         
         print(f"   Cumulative Production: {cumulative_to_date:,.0f} bbls")
         print(f"   EUR (Total Recovery):  {eur:,.0f} bbls")
@@ -180,9 +418,9 @@ def analyze_production():
         # 6. Generate forecast (starting from month 90)
         print("\n🔮 Generating 10-year production forecast...")
         forecast_months = 120  # 10 years
-        # Forecast starts at month 90, offset by 70 (our fitting baseline)
+        # Forecast starts at month 90, offset by FIT_START_MONTH (our fitting baseline)
         t_forecast = np.arange(20, 20 + forecast_months)  # 20 months from fitting start
-        q_forecast = hyperbolic_decline(t_forecast, qi_fit, Di_fit, b_fit)
+        q_forecast = decline(t_forecast)
         
         # Create forecast dataframe
         last_date = monthly['year_month'].max()
@@ -194,80 +432,72 @@ def analyze_production():
         
         forecast_df = pd.DataFrame({
             'forecast_date': forecast_dates,
-            'months_on_production': np.arange(90, 90 + forecast_months),  # Changed this line
+            'months_on_production': np.arange(90, 90 + forecast_months, dtype=np.int32),
             'predicted_oil': q_forecast
         })
         
         print(f"✅ Generated {len(forecast_df)} months of forecast")
         
         # 7. Create visualization
-        print("\n📊 Creating visualization...")
-        plt.figure(figsize=(12, 6))
+        if GENERATE_PLOT:
+            print("\n📊 Creating visualization...")
+            # Imported here so batch runs and module imports skip matplotlib;
+            # Agg renders straight to file without a GUI backend
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            
+            plt.figure(figsize=(12, 6))
         
-        # Plot historical data
-        plt.plot(monthly['year_month'], monthly['oil_volume'], 
-                'o', label='Actual Production', markersize=4)
+            # Plot historical data
+            plt.plot(monthly['year_month'], monthly['oil_volume'], 
+                    'o', label='Actual Production', markersize=4)
         
-        # Plot fitted curve
-        t_all = np.concatenate([t, t_forecast])
-        q_all = hyperbolic_decline(t_all, qi_fit, Di_fit, b_fit)
-        dates_all = pd.date_range(
-            start=monthly['year_month'].min(),
-            periods=len(t_all),
-            freq='MS'
-        )
-        plt.plot(dates_all[:len(t)], q_all[:len(t)], 
-                'r-', label='Decline Curve Fit', linewidth=2)
+            # Plot fitted curve
+            t_all = np.concatenate([t, t_forecast])
+            q_all = decline(t_all)
+            dates_all = pd.date_range(
+                start=monthly['year_month'].min(),
+                periods=len(t_all),
+                freq='MS'
+            )
+            plt.plot(dates_all[:len(t)], q_all[:len(t)], 
+                    'r-', label='Decline Curve Fit', linewidth=2)
         
-        # Plot forecast
-        plt.plot(dates_all[len(t):], q_all[len(t):], 
-                'g--', label='Forecast', linewidth=2)
+            # Plot forecast
+            plt.plot(dates_all[len(t):], q_all[len(t):], 
+                    'g--', label='Forecast', linewidth=2)
         
-        plt.xlabel('Date')
-        plt.ylabel('Oil Production (bbl/month)')
-        plt.title('Well Production Decline Curve Analysis')
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
+            plt.xlabel('Date')
+            plt.ylabel('Oil Production (bbl/month)')
+            plt.title('Well Production Decline Curve Analysis')
+            plt.legend()
+            plt.grid(True, alpha=0.3)
+            plt.tight_layout()
         
-        # Save plot
-        plot_path = r"E:\Documents-E\Full-Stack Analyst Project\decline_curve.png"
-        plt.savefig(plot_path, dpi=300)
-        print(f"✅ Chart saved to: {plot_path}")
-        plt.close()
+            # Save plot
+            plt.savefig(PLOT_PATH, dpi=PLOT_DPI)
+            print(f"✅ Chart saved to: {PLOT_PATH}")
+            plt.close()
         
         # 8. Save results to database
         print("\n💾 Saving results to database...")
         
-        # Save decline parameters
-        params_df = pd.DataFrame([{
-            'well_id': 'WELL_001',
-            'qi': qi_fit,
-            'di': Di_fit,
-            'b_factor': b_fit,
-            'r_squared': r_squared,
-            'eur': eur,
-            'cumulative_production': cumulative_to_date,
-            'remaining_reserves': remaining_reserves,
-            'analysis_date': datetime.now()
-        }])
-        
-        params_df.to_sql('decline_parameters', engine, 
-                        if_exists='replace', index=False)
-        print("✅ Decline parameters saved")
-        
-        # Save forecast
-        forecast_df.to_sql('production_forecast', engine,
-                          if_exists='replace', index=False)
-        print("✅ Forecast saved")
-        
-        # Save monthly aggregated data
-        monthly[['year_month', 'months_on_production', 'oil_volume', 
-                'gas_volume', 'water_volume']].to_sql(
-            'monthly_production', engine,
-            if_exists='replace', index=False
-        )
-        print("✅ Monthly production saved")
+        # Replace all three tables in one transaction so readers never
+        # see a mix of old and new results
+        with engine.begin() as conn:
+            with conn.connection.cursor() as cur:
+                replace_table_rows(cur, 'decline_parameters', params_df)
+                print("✅ Decline parameters saved")
+                
+                replace_table_rows(cur, 'production_forecast', forecast_df)
+                print("✅ Forecast saved")
+                
+                replace_table_rows(cur, 'monthly_production', monthly[[
+                    'year_month', 'months_on_production', 'oil_volume',
+                    'gas_volume', 'water_volume'
+                ]])
+                print("✅ Monthly production saved")
         
         print(f"\n{'=' * 70}")
         print("✅ ANALYSIS COMPLETE!")
@@ -0,0 +1,39 @@
+"""
+Shared PostgreSQL connection for the analysis scripts
+"""
+
+from functools import lru_cache
+
+from sqlalchemy import create_engine
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# PostgreSQL connection details
+DB_USER = "postgres"
+DB_PASSWORD = "motorola"  # ← CHANGE THIS!
+DB_HOST = "localhost"
+DB_PORT = "5432"
+DB_NAME = "well_decline_analysis"
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    Return the process-wide SQLAlchemy engine (created on first call)
+
+    Connections are pooled and checked with a ping before reuse, and any
+    executemany INSERT is sent through psycopg2's execute_values helper.
+    """
+    connection_string = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    return create_engine(
+        connection_string,
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,
+        executemany_mode='values_plus_batch'
+    )